@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of arXiv Atom feed parsing: the streaming parser in
+check_paper.parse_arxiv_entries against the BeautifulSoup(lxml-xml) approach
+it replaced, on synthetic feeds built from the recorded response.
+
+Example:
+    python backend/benchmarks/bench_arxiv_parse.py --entries 5 50 500 --repeat 50
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from stub_server import load_recordings
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scrapers")))
+import check_paper  # noqa: E402
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def build_feed(entry_count):
+    """Replicate the recorded feed's entries until the feed holds entry_count of them."""
+    recorded = load_recordings()["arxiv"][0]["body"]
+    entries = re.findall(r"<entry>.*?</entry>", recorded, re.DOTALL)
+    head = recorded[:recorded.index("<entry>")]
+    body = "".join(entries[i % len(entries)] for i in range(entry_count))
+    return (head + body + "</feed>\n").encode("utf-8")
+
+
+def parse_soup(data):
+    soup = BeautifulSoup(data.decode("utf-8"), "lxml-xml")
+    return [{"title": entry.title.text.strip(), "link": entry.id.text.strip()} for entry in soup.find_all("entry")]
+
+
+def time_parser(parse, data, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(data)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "p50_ms": samples[len(samples) // 2],
+        "min_ms": samples[0],
+        "mean_ms": sum(samples) / len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare arXiv Atom feed parse time per feed.")
+    parser.add_argument("--entries", type=int, nargs="+", default=[5, 50, 500], help="Entries per synthetic feed.")
+    parser.add_argument("--repeat", type=int, default=50, help="Parses timed per feed and parser.")
+    args = parser.parse_args()
+
+    parsers = {"streaming": check_paper.parse_arxiv_entries}
+    if BeautifulSoup is not None:
+        parsers["beautifulsoup_lxml_xml"] = parse_soup
+
+    report = {"repeat": args.repeat, "feeds": []}
+    for count in args.entries:
+        data = build_feed(count)
+        expected = check_paper.parse_arxiv_entries(data)
+        result = {"entries": count, "bytes": len(data), "parsers": {}}
+        for name, parse in parsers.items():
+            if parse(data) != expected:
+                raise SystemExit(f"{name} disagrees with the streaming parser on a {count}-entry feed")
+            result["parsers"][name] = time_parser(parse, data, args.repeat)
+        report["feeds"].append(result)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Startup-time benchmark for the metadata-only scraper paths.
+
+The server spawns a fresh Python process per request, so import cost is paid
+on every call. Each probe below runs in a new interpreter against the local
+stub server and reports the time from spawn to first result, plus any heavy
+ML/document modules (torch, transformers, fitz, docx) it pulled in. The run
+fails if a probe exceeds --budget_ms or imports a heavy module.
+
+Example:
+    python backend/benchmarks/bench_startup.py --repeat 5 --budget_ms 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from stub_server import FIXTURES_DIR, start_stub_server, stub_environment
+
+SCRAPERS_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scrapers"))
+
+HEAVY_MODULES = ("torch", "transformers", "fitz", "docx")
+
+# Each probe imports one scraper and produces its first result.
+PROBES = {
+    "check_paper_verify": "import check_paper\nresult = check_paper.verify('10.1109/CVPR.2016.90')",
+    "doi_metadata": "import doi_citation\nresult = doi_citation.get_combined_metadata('10.1109/CVPR.2016.90')",
+    "doi_rank_references": (
+        "import doi_citation\n"
+        "result = doi_citation.rank_references('Deep residual learning', '', [{'title': 'Residual networks'}])"
+    ),
+    "isbn_lookup": "import isbn_citation\nresult = isbn_citation.search_isbn('9780262035613')",
+    "document_txt": (
+        "import document_scraper\n"
+        f"result = document_scraper.process_file({os.path.join(FIXTURES_DIR, 'sample.txt')!r})"
+    ),
+}
+
+# Wraps a probe to time its import and first call and list heavy modules loaded.
+CHILD_TEMPLATE = """
+import json, sys, time
+start = time.perf_counter()
+{probe}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "in_process_ms": elapsed * 1000.0,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_probe(code, env):
+    child = CHILD_TEMPLATE.format(probe=code, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", child], cwd=SCRAPERS_DIR, env=env,
+                               capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - start) * 1000.0
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = wall_ms
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time-to-first-result of metadata-only scraper calls in a fresh process.")
+    parser.add_argument("--probe", action="append", choices=sorted(PROBES), help="Probe to run (repeatable). Defaults to all.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per probe.")
+    parser.add_argument("--budget_ms", type=float, default=1000.0, help="Maximum median time-to-first-result per probe.")
+    args = parser.parse_args()
+
+    server = start_stub_server()
+    env = dict(os.environ, **stub_environment(server.base_url))
+    env.pop("VERIFAI_TIMINGS", None)
+    # Every repeat should do the real lookups, not reuse the previous one's answers.
+    env["VERIFAI_SHARED_DIR"] = tempfile.mkdtemp(prefix="verifai-startup-")
+    env["VERIFAI_NEGATIVE_CACHE_TTL"] = "0"
+
+    report = {"budget_ms": args.budget_ms, "repeat": args.repeat, "probes": {}}
+    failed = False
+    try:
+        for name in args.probe or list(PROBES):
+            runs = [run_probe(PROBES[name], env) for _ in range(args.repeat)]
+            errors = [run["error"] for run in runs if "error" in run]
+            if errors:
+                report["probes"][name] = {"error": errors[0]}
+                failed = True
+                continue
+            wall = sorted(run["wall_ms"] for run in runs)
+            in_process = sorted(run["in_process_ms"] for run in runs)
+            heavy = sorted({module for run in runs for module in run["heavy_modules"]})
+            median_wall = wall[len(wall) // 2]
+            within_budget = median_wall <= args.budget_ms and not heavy
+            failed = failed or not within_budget
+            report["probes"][name] = {
+                "median_wall_ms": median_wall,
+                "max_wall_ms": wall[-1],
+                "median_import_and_call_ms": in_process[len(in_process) // 2],
+                "heavy_modules": heavy,
+                "within_budget": within_budget,
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
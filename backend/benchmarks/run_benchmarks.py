@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Offline benchmark suite for the scrapers.
+
+Starts the local stub server (stub_server.py), points the scrapers at it via
+the VERIFAI_*_URL environment variables and times each scenario. Results are
+written as JSON with p50/p95/p99 latency and throughput per scenario.
+
+Example:
+    python backend/benchmarks/run_benchmarks.py --iterations 50 --latency_ms 40 --error_rate 0.05
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stub_server import FIXTURES_DIR, DEFAULT_RECORDINGS, SERVICES, StubConfig, load_recordings, start_stub_server, stub_environment
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRAPERS_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "..", "scrapers"))
+UPLOADS_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "..", "uploads"))
+
+BENCHMARK_DOI = "10.1109/CVPR.2016.90"
+BENCHMARK_ISBN = "9780262035613"
+
+
+class SkipScenario(Exception):
+    """Raised by a scenario setup when it cannot run in this environment."""
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def read_lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# --- Scenarios ---------------------------------------------------------------
+# Each setup function receives the parsed arguments and returns a callable
+# that performs one iteration. Heavy imports happen in setup so that they are
+# not counted in the per-iteration latency.
+
+def setup_single_verify(args):
+    import check_paper
+    return lambda: check_paper.verify(BENCHMARK_DOI)
+
+
+def setup_bibliography_batch(args):
+    import check_paper
+    queries = read_lines(os.path.join(FIXTURES_DIR, "bibliography.txt"))
+
+    def run():
+        with ThreadPoolExecutor(max_workers=args.batch_workers) as pool:
+            return list(pool.map(check_paper.verify, queries))
+    return run
+
+
+def setup_reading_list(args):
+    # A class uploading the same reading list: many concurrent verifications
+    # of the same DOI, which single-flight coalescing should collapse.
+    import check_paper
+
+    def run():
+        with ThreadPoolExecutor(max_workers=args.batch_workers) as pool:
+            return list(pool.map(check_paper.verify, [BENCHMARK_DOI] * args.batch_workers * 4))
+    return run
+
+
+def setup_reading_list_processes(args):
+    # The same reading list as the server actually runs it: one check_paper.py
+    # process per verification, coalescing through the shared directory.
+    def run():
+        processes = [subprocess.Popen([sys.executable, os.path.join(SCRAPERS_DIR, "check_paper.py"), BENCHMARK_DOI],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                     for _ in range(args.batch_workers * 4)]
+        if any(process.wait() != 0 for process in processes):
+            raise RuntimeError("check_paper.py failed")
+    return run
+
+
+def setup_arxiv_id_batch(args):
+    # Resolving the arXiv identifiers of a large bibliography with batched
+    # id_list queries rather than one search per reference.
+    import check_paper
+    references = [f"Author {i}, Some preprint, arXiv:{1500 + i // 100:04d}.{i:05d}v1" for i in range(200)]
+
+    def run():
+        result = check_paper.verify_references(references)
+        if result["arxiv"]["failed"]:
+            raise RuntimeError("batched arXiv lookup failed")
+        return result
+    return run
+
+
+def setup_doi_bulk_resolve(args):
+    # Verifying the DOIs of a 200-reference bibliography with chunked
+    # multi-DOI CrossRef queries rather than one /works/{doi} lookup each.
+    import check_paper
+    known = ["10.1109/CVPR.2016.90", "10.1109/5.726791", "10.1145/3065386", "10.5555/verifai.retracted.0001"]
+    references = [f"[{i + 1}] Author {i}, Some article, 2019, doi:{known[i] if i < len(known) else f'10.5555/verifai.{i:04d}'}."
+                  for i in range(200)]
+
+    def run():
+        result = check_paper.verify_references(references)
+        if "10.5555/verifai.retracted.0001" not in result["resolved"]:
+            raise RuntimeError("bulk DOI resolution returned no works")
+        return result
+    return run
+
+
+def require_transformers():
+    if importlib.util.find_spec("transformers") is None:
+        raise SkipScenario("transformers is not installed")
+
+
+def setup_doi_metadata(args):
+    # The metadata-only path of doi_citation, which must not load the model.
+    import doi_citation
+
+    def run():
+        paper_info = doi_citation.get_combined_metadata(BENCHMARK_DOI)
+        if "error" in paper_info:
+            raise RuntimeError(paper_info["error"])
+        doi_citation.search_retracted_papers(paper_info["title"])
+        return paper_info
+    return run
+
+
+def setup_doi_analysis(args):
+    require_transformers()
+    import doi_citation
+    try:
+        doi_citation.load_model()
+    except Exception as e:  # model not downloadable
+        raise SkipScenario(f"GPT-2 citation model unavailable: {e}")
+
+    def run():
+        result = doi_citation.main(BENCHMARK_DOI)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "DOI analysis failed"))
+        return result
+    return run
+
+
+def setup_isbn_citation(args):
+    require_transformers()
+    import isbn_citation
+    try:
+        isbn_citation.load_pipeline()
+    except Exception as e:
+        raise SkipScenario(f"T5 citation pipeline unavailable: {e}")
+
+    def run():
+        result = isbn_citation.main(BENCHMARK_ISBN)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "ISBN lookup failed"))
+        return result
+    return run
+
+
+def make_document_setup(path):
+    def setup(args):
+        import document_scraper
+        if not os.path.exists(path):
+            raise SkipScenario(f"fixture not found: {path}")
+
+        def run():
+            output = document_scraper.process_file(path)
+            if "error" in output:
+                raise RuntimeError(output["error"])
+            if output["text"].startswith("Error"):
+                raise SkipScenario(output["text"])
+            return output
+        return run
+    return setup
+
+
+SCENARIOS = {
+    "single_verify": setup_single_verify,
+    "bibliography_batch": setup_bibliography_batch,
+    "reading_list": setup_reading_list,
+    "reading_list_processes": setup_reading_list_processes,
+    "arxiv_id_batch": setup_arxiv_id_batch,
+    "doi_bulk_resolve": setup_doi_bulk_resolve,
+    "doi_metadata": setup_doi_metadata,
+    "doi_analysis": setup_doi_analysis,
+    "isbn_citation": setup_isbn_citation,
+    "document_pdf": make_document_setup(os.path.join(UPLOADS_DIR, "test.pdf")),
+    "document_docx": make_document_setup(os.path.join(FIXTURES_DIR, "sample.docx")),
+    "document_txt": make_document_setup(os.path.join(FIXTURES_DIR, "sample.txt")),
+}
+
+
+# Scenarios that measure coalescing and the not-found cache keep it across
+# iterations; every other one starts each iteration with an empty cache so it
+# times the upstream path rather than a cache lookup.
+CACHE_SCENARIOS = {"reading_list", "reading_list_processes"}
+
+
+def run_scenario(name, args):
+    """Run one scenario and summarise its latency distribution."""
+    import singleflight
+    reset_cache = name not in CACHE_SCENARIOS
+    try:
+        run = SCENARIOS[name](args)
+        for _ in range(args.warmup):
+            run()
+    except SkipScenario as e:
+        return {"status": "skipped", "reason": str(e)}
+
+    latencies = []
+    errors = []
+
+    def timed():
+        if reset_cache:
+            singleflight.clear()
+        start = time.perf_counter()
+        try:
+            run()
+        except SkipScenario:
+            raise
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    try:
+        if args.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                for future in [pool.submit(timed) for _ in range(args.iterations)]:
+                    future.result()
+        else:
+            for _ in range(args.iterations):
+                timed()
+    except SkipScenario as e:
+        return {"status": "skipped", "reason": str(e)}
+    wall_time = time.perf_counter() - wall_start
+
+    samples = sorted(latency * 1000.0 for latency in latencies)
+    return {
+        "status": "ok",
+        "iterations": len(samples),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "mean_ms": sum(samples) / len(samples) if samples else None,
+        "max_ms": samples[-1] if samples else None,
+        "throughput_per_s": len(samples) / wall_time if wall_time > 0 else None,
+        "wall_time_s": wall_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers offline against a local stub of the external APIs.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Scenario to run (repeatable). Defaults to all.")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed iterations per scenario.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed warm-up iterations per scenario.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent iterations per scenario.")
+    parser.add_argument("--batch_workers", type=int, default=4, help="Worker threads used by bibliography_batch.")
+    parser.add_argument("--recordings", type=str, default=DEFAULT_RECORDINGS, help="Path to the recorded responses (JSON).")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="Stub latency per response in milliseconds.")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="Uniform +/- jitter applied to the stub latency.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of stub responses replaced by errors.")
+    parser.add_argument("--error_status", type=int, default=503, help="HTTP status used for injected errors.")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for jitter and error injection.")
+    parser.add_argument("--down_service", action="append", default=[], choices=SERVICES, help="Stub service that fails every request, simulating an outage (repeatable).")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--prometheus_output", type=str, default=None, help="Enable stage metrics and write them here in Prometheus text format.")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Enable stage metrics and serve them on this port at /metrics while running.")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.seed, args.down_service)
+    server = start_stub_server(recordings=load_recordings(args.recordings), config=config)
+
+    # The scrapers read their endpoints at import time, so the environment
+    # has to be in place before the first scenario imports them. A private
+    # shared directory keeps cached answers and breaker state of earlier runs
+    # (and of the live server) out of the measurements.
+    os.environ.update(stub_environment(server.base_url))
+    os.environ["VERIFAI_SHARED_DIR"] = tempfile.mkdtemp(prefix="verifai-bench-")
+    sys.path.insert(0, SCRAPERS_DIR)
+    import metrics
+    import sources
+    if args.prometheus_output or args.metrics_port:
+        metrics.enable()
+    if args.metrics_port:
+        metrics.start_metrics_server(args.metrics_port)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stub": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+            "down_services": args.down_service,
+        },
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            report["scenarios"][name] = run_scenario(name, args)
+    finally:
+        server.shutdown()
+        server.server_close()
+    report["stub"]["requests"] = dict(config.request_counts)
+    report["stub"]["injected_errors"] = config.injected_errors
+    report["counters"] = metrics.counters()
+    report["sources"] = sources.health()
+
+    if args.prometheus_output:
+        with open(args.prometheus_output, "w", encoding="utf-8") as f:
+            f.write(metrics.render_prometheus())
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
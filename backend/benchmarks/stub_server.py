@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Local stub for the external metadata APIs (arXiv, Semantic Scholar, CrossRef
+and OpenLibrary). It replays the responses recorded in
+fixtures/recorded_responses.json with configurable latency and error
+injection, so the scrapers can be benchmarked without touching the network.
+
+Each service is mounted under its own prefix (/arxiv, /semantic_scholar,
+/crossref, /openlibrary); stub_environment() returns the VERIFAI_*_URL
+variables that point backend/scrapers/endpoints.py at the stub.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote_plus, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_RECORDINGS = os.path.join(FIXTURES_DIR, "recorded_responses.json")
+
+SERVICES = ("arxiv", "semantic_scholar", "crossref", "openlibrary")
+
+
+def load_recordings(path=DEFAULT_RECORDINGS):
+    """Load recorded responses, keyed by service name."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class StubConfig:
+    """Latency and error-injection settings shared by all handler threads."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503, seed=None, down_services=()):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Services simulating an outage: every request fails with error_status.
+        self.down_services = set(down_services)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_counts = {service: 0 for service in SERVICES}
+        self.injected_errors = 0
+
+    def next_delay(self):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def should_fail(self, service):
+        if service in self.down_services:
+            with self.lock:
+                self.injected_errors += 1
+            return True
+        if not self.error_rate:
+            return False
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.injected_errors += 1
+        return failed
+
+    def record_request(self, service):
+        with self.lock:
+            self.request_counts[service] = self.request_counts.get(service, 0) + 1
+
+
+def find_recording(recordings, service, path, query=""):
+    """
+    Return the recording with the longest path prefix matching the request.
+    A recording with a "query" fragment only matches requests whose decoded
+    query string contains it, and wins over one without.
+    """
+    best = None
+    best_rank = None
+    for entry in recordings.get(service, []):
+        if not path.startswith(entry["path"]):
+            continue
+        if "query" in entry and entry["query"] not in query:
+            continue
+        rank = (len(entry["path"]), "query" in entry)
+        if best is None or rank > best_rank:
+            best, best_rank = entry, rank
+    return best
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "VerifAIStub/1.0"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        service, _, rest = parts.path.lstrip("/").partition("/")
+        config = self.server.config
+
+        if service not in SERVICES:
+            return self._send(404, "application/json", json.dumps({"error": "unknown service"}).encode())
+        config.record_request(service)
+
+        delay = config.next_delay()
+        if delay:
+            time.sleep(delay)
+
+        if config.should_fail(service):
+            body = json.dumps({"error": "injected failure"}).encode()
+            return self._send(config.error_status, "application/json", body)
+
+        entry = find_recording(self.server.recordings, service, "/" + rest, unquote_plus(parts.query))
+        if entry is None:
+            return self._send(404, "application/json", json.dumps({"error": "no recording"}).encode())
+
+        if "json" in entry:
+            body = json.dumps(entry["json"]).encode()
+            content_type = entry.get("content_type", "application/json")
+        else:
+            body = entry["body"].encode("utf-8")
+            content_type = entry.get("content_type", "text/plain; charset=utf-8")
+        self._send(entry.get("status", 200), content_type, body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Request logging would dominate the benchmark output.
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recordings, config):
+        super().__init__(address, StubHandler)
+        self.recordings = recordings
+        self.config = config
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(host="127.0.0.1", port=0, recordings=None, config=None):
+    """Start the stub in a background thread and return the server."""
+    server = StubServer((host, port), recordings or load_recordings(), config or StubConfig())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def stub_environment(base_url):
+    """Environment overrides that route the scrapers to the stub at base_url."""
+    return {
+        "VERIFAI_ARXIV_URL": f"{base_url}/arxiv/api/query",
+        "VERIFAI_SEMANTIC_SCHOLAR_URL": f"{base_url}/semantic_scholar/graph/v1",
+        "VERIFAI_CROSSREF_URL": f"{base_url}/crossref",
+        "VERIFAI_OPENLIBRARY_URL": f"{base_url}/openlibrary",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded metadata API responses from a local stub server.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Interface to bind.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--recordings", type=str, default=DEFAULT_RECORDINGS, help="Path to the recorded responses (JSON).")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="Added latency per response in milliseconds.")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="Uniform +/- jitter applied to the latency.")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Fraction of requests answered with --error_status.")
+    parser.add_argument("--error_status", type=int, default=503, help="HTTP status used for injected errors.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for jitter and error injection.")
+    parser.add_argument("--down_service", action="append", default=[], choices=SERVICES, help="Service that fails every request (repeatable).")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.seed, args.down_service)
+    server = StubServer((args.host, args.port), load_recordings(args.recordings), config)
+    print("Stub server listening. Export these to route the scrapers to it:")
+    for key, value in stub_environment(server.base_url).items():
+        print(f"export {key}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,34 @@
 import sys
-import requests
 import json
 import re
-from bs4 import BeautifulSoup
+from xml.etree import ElementTree
+from endpoints import ARXIV_API_URL, SEMANTIC_SCHOLAR_API_URL, CROSSREF_API_URL
+import metrics
+import singleflight
+import sources
+import http_client
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+
+# Maximum number of identifiers sent in one arXiv id_list query.
+ARXIV_ID_LIST_CHUNK = 100
+
+# Read size when streaming arXiv responses into the feed parser.
+ARXIV_CHUNK_BYTES = 16384
+
+# New-style (2101.00001, optionally versioned) and old-style (hep-th/9901001) arXiv identifiers.
+ARXIV_ID_PATTERN = re.compile(
+    r"(?:arxiv[:\s]*|arxiv\.org/(?:abs|pdf)/)((?:\d{4}\.\d{4,5})|(?:[a-z\-]+(?:\.[A-Z]{2})?/\d{7}))(?:v\d+)?",
+    re.IGNORECASE
+)
+
+# DOIs sent in one filtered CrossRef /works query, and the page size used for
+# cursor paging through its results.
+CROSSREF_DOI_CHUNK = 50
+CROSSREF_ROWS = 100
+
+# A DOI anywhere in a reference string; trailing punctuation is stripped afterwards.
+DOI_PATTERN = re.compile(r"\b10\.\d{4,9}/[^\s\"'<>,;]+", re.IGNORECASE)
 
 def is_doi(query):
     """Check if the query is a DOI"""
@@ -10,26 +36,304 @@ def is_doi(query):
     doi_pattern = re.compile(r'^10\.\d{4,9}/[-._;()/:A-Z0-9]+$', re.IGNORECASE)
     return bool(doi_pattern.match(query.strip()))
 
+@singleflight.coalesced("arxiv", "search")
+@sources.routed("arxiv", fallback=list)
+@metrics.instrument()
 def search_arxiv(query):
     """Search ArXiv API for research papers."""
-    base_url = "http://export.arxiv.org/api/query"
+    base_url = ARXIV_API_URL
     params = {
         "search_query": f"all:{query}",
         "start": 0,
         "max_results": 5
     }
 
-    response = requests.get(base_url, params=params)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "lxml-xml")  # Explicitly use lxml parser
-        entries = soup.find_all("entry")
-
-        return [{"title": entry.title.text.strip(), "link": entry.id.text.strip()} for entry in entries] if entries else []
+    with http_client.get(base_url, params=params, stream=True) as response:
+        if response.status_code == 200:
+            return parse_arxiv_entries(_arxiv_chunks(response))
     return []
 
+def _arxiv_chunks(response):
+    """Yield a streamed response body in chunks, noting its size on the running stage."""
+    size = 0
+    for chunk in response.iter_content(chunk_size=ARXIV_CHUNK_BYTES):
+        size += len(chunk)
+        yield chunk
+    metrics.note(bytes_in=size)
+
+def parse_arxiv_entries(chunks):
+    """
+    Pull the title and id of each entry out of an arXiv Atom feed.
+    Streams over the raw bytes (a bytes object or an iterable of byte chunks)
+    instead of decoding the body and building a full document tree.
+    """
+    if isinstance(chunks, (bytes, bytearray)):
+        chunks = (chunks,)
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    entries = []
+    state = {"entry": None, "depth": 0}
+    for chunk in chunks:
+        parser.feed(chunk)
+        _read_arxiv_events(parser, state, entries)
+    parser.close()
+    _read_arxiv_events(parser, state, entries)
+    return entries
+
+def _read_arxiv_events(parser, state, entries):
+    for event, elem in parser.read_events():
+        if state["entry"] is None:
+            if event == "start" and elem.tag == ATOM_NS + "entry":
+                state["entry"] = {"title": "", "link": ""}
+                state["depth"] = 0
+            continue
+        if event == "start":
+            state["depth"] += 1
+        elif elem.tag == ATOM_NS + "entry":
+            entries.append(state["entry"])
+            state["entry"] = None
+            elem.clear()
+        else:
+            # Only direct children of <entry>; author names etc. are skipped.
+            if state["depth"] == 1:
+                if elem.tag == ATOM_NS + "title":
+                    state["entry"]["title"] = (elem.text or "").strip()
+                elif elem.tag == ATOM_NS + "id":
+                    state["entry"]["link"] = (elem.text or "").strip()
+            state["depth"] -= 1
+
+def canonical_arxiv_id(arxiv_id):
+    """
+    The form arXiv uses in its links: old-style archives are lowercase and
+    without the subject class ('HEP-TH/9901001', 'math.GT/0309136' ->
+    'hep-th/9901001', 'math/0309136'). New-style identifiers are unchanged.
+    """
+    if "/" not in arxiv_id:
+        return arxiv_id
+    archive, number = arxiv_id.split("/", 1)
+    return f"{archive.split('.')[0].lower()}/{number}"
+
+def extract_arxiv_ids(references):
+    """
+    Unique canonical arXiv identifiers (without version) mentioned in a
+    reference list, in order. Like extract_dois, accepts reference strings as
+    well as reference dicts, whose "title" field is searched.
+    """
+    ids = []
+    for reference in references:
+        text = reference.get("title", "") if isinstance(reference, dict) else reference
+        for match in ARXIV_ID_PATTERN.finditer(text):
+            arxiv_id = canonical_arxiv_id(match.group(1))
+            if arxiv_id not in ids:
+                ids.append(arxiv_id)
+    return ids
+
+def arxiv_id_from_link(link):
+    """'http://arxiv.org/abs/1706.03762v7' -> '1706.03762'"""
+    arxiv_id = link.rsplit("/abs/", 1)[-1]
+    return re.sub(r"v\d+$", "", arxiv_id)
+
+@sources.routed("arxiv", fallback=lambda: None)
+@metrics.instrument()
+def fetch_arxiv_id_list(ids):
+    """
+    Fetch the entries for up to ARXIV_ID_LIST_CHUNK identifiers in one query.
+    Returns None if the query failed.
+    """
+    params = {
+        "id_list": ",".join(ids),
+        "start": 0,
+        "max_results": len(ids)
+    }
+    with http_client.get(ARXIV_API_URL, params=params, stream=True) as response:
+        if response.status_code == 200:
+            return parse_arxiv_entries(_arxiv_chunks(response))
+    return None
+
+def resolve_arxiv_ids(ids):
+    """
+    Resolve many arXiv identifiers with batched id_list queries instead of
+    one search per reference.
+
+    Returns (resolved, failed). resolved maps each identifier arXiv knows
+    about to {"title", "link"}; failed lists the identifiers whose query
+    failed (or was skipped), which are therefore unverified.
+    """
+    resolved = {}
+    failed = []
+    wanted = set(ids)
+    for start in range(0, len(ids), ARXIV_ID_LIST_CHUNK):
+        chunk = ids[start:start + ARXIV_ID_LIST_CHUNK]
+        entries = fetch_arxiv_id_list(chunk)
+        if entries is None:
+            failed.extend(chunk)
+            continue
+        for entry in entries:
+            arxiv_id = arxiv_id_from_link(entry["link"])
+            # Unknown identifiers come back as an entry pointing at api/errors.
+            if arxiv_id in wanted:
+                resolved[arxiv_id] = entry
+    return resolved, failed
+
+def extract_dois(references):
+    """
+    Unique DOIs (lowercased) in a reference list, in order. Accepts reference
+    strings as well as the reference dicts returned by
+    doi_citation.get_paper_by_doi, whose "doi" field is used when present.
+    """
+    dois = []
+    seen = set()
+    for reference in references:
+        if isinstance(reference, dict):
+            candidates = [reference["doi"]] if reference.get("doi") else DOI_PATTERN.findall(reference.get("title", ""))
+        else:
+            candidates = DOI_PATTERN.findall(reference)
+        for candidate in candidates:
+            doi = candidate.replace("https://doi.org/", "").strip().rstrip(".)]").lower()
+            if is_doi(doi) and doi not in seen:
+                seen.add(doi)
+                dois.append(doi)
+    return dois
+
+def _crossref_pages(params):
+    """
+    All items of a filtered /works query, following next-cursor. Returns
+    None if any page failed, so an outage is not mistaken for "no such DOI".
+    """
+    base_url = f"{CROSSREF_API_URL}/works"
+    headers = {
+        "User-Agent": "VerifAI/1.0"
+    }
+    params = dict(params, rows=CROSSREF_ROWS, cursor="*")
+    items = []
+    while True:
+        response = http_client.get(base_url, params=params, headers=headers)
+        if response.status_code != 200:
+            return None
+        message = response.json().get("message", {})
+        page = message.get("items", [])
+        items.extend(page)
+        if len(page) < CROSSREF_ROWS or not message.get("next-cursor"):
+            return items
+        params["cursor"] = message["next-cursor"]
+
+@sources.routed("crossref", fallback=lambda: None)
+@metrics.instrument()
+def fetch_crossref_dois(dois):
+    """
+    Fetch the works for up to CROSSREF_DOI_CHUNK DOIs in one filtered query.
+    Returns None when CrossRef could not be queried.
+    """
+    params = {
+        "filter": ",".join(f"doi:{doi}" for doi in dois),
+        "select": "DOI,title,publisher,published-print"
+    }
+    items = _crossref_pages(params)
+    if items is None:
+        return None
+    return [{
+        "title": (item.get("title") or [""])[0],
+        "doi": item.get("DOI", "").lower(),
+        "publisher": item.get("publisher", ""),
+        "year": item["published-print"].get("date-parts", [[""]])[0][0] if "published-print" in item else ""
+    } for item in items]
+
+@sources.routed("crossref", fallback=lambda: None)
+@metrics.instrument()
+def fetch_crossref_retractions(dois):
+    """
+    Fetch the retraction notices for up to CROSSREF_DOI_CHUNK DOIs in one
+    filtered query. Returns None when CrossRef could not be queried.
+    """
+    params = {
+        "filter": ",".join(f"updates:{doi}" for doi in dois),
+        "select": "DOI,title,update-to"
+    }
+    items = _crossref_pages(params)
+    if items is None:
+        return None
+    notices = []
+    for item in items:
+        for update in item.get("update-to", []):
+            if update.get("type") == "retraction" and update.get("DOI"):
+                notices.append({
+                    "title": (item.get("title") or [""])[0],
+                    "doi": item.get("DOI", ""),
+                    "retracts": update["DOI"].lower()
+                })
+    return notices
+
+def resolve_dois(dois):
+    """
+    Resolve many DOIs with chunked multi-DOI CrossRef queries instead of one
+    /works/{doi} lookup each, fetching retraction notices the same way.
+
+    Returns (resolved, failed). resolved maps each DOI CrossRef knows about
+    to {"title", "doi", "publisher", "year", "is_retracted"}; retracted ones
+    also get "retraction_info", and is_retracted is None when the retraction
+    query for its chunk failed. failed lists the DOIs whose lookup failed
+    (or skipped, or could not be batched), which are therefore unverified.
+    """
+    dois = [doi.lower() for doi in dois]
+    # A comma would split the filter value, so such DOIs cannot be batched.
+    failed = [doi for doi in dois if "," in doi]
+    dois = [doi for doi in dois if "," not in doi]
+    wanted = set(dois)
+    resolved = {}
+    retractions = {}
+    for start in range(0, len(dois), CROSSREF_DOI_CHUNK):
+        chunk = dois[start:start + CROSSREF_DOI_CHUNK]
+        works = fetch_crossref_dois(chunk)
+        if works is None:
+            failed.extend(chunk)
+            continue
+        notices = fetch_crossref_retractions(chunk)
+        for work in works:
+            if work["doi"] in wanted:
+                resolved[work["doi"]] = dict(work, is_retracted=False if notices is not None else None)
+        for notice in notices or []:
+            retractions.setdefault(notice.pop("retracts"), []).append(notice)
+    for doi, notices in retractions.items():
+        if doi in resolved:
+            resolved[doi]["is_retracted"] = True
+            resolved[doi]["retraction_info"] = notices
+    return resolved, failed
+
+def verify_references(references):
+    """
+    Bulk-verify the DOIs and arXiv identifiers found in a reference list.
+    Returns the DOIs found, which of them CrossRef resolved (with retraction
+    flags), which it does not know ("unresolved") and which could not be
+    checked ("failed"); the arXiv identifiers are reported the same way
+    under "arxiv".
+    """
+    with sources.tracking() as skipped:
+        dois = extract_dois(references)
+        resolved, failed = resolve_dois(dois)
+        arxiv_ids = extract_arxiv_ids(references)
+        arxiv_resolved, arxiv_failed = resolve_arxiv_ids(arxiv_ids)
+    failed_set = set(failed)
+    arxiv_failed_set = set(arxiv_failed)
+    return {
+        "dois": dois,
+        "resolved": resolved,
+        "unresolved": [doi for doi in dois if doi not in resolved and doi not in failed_set],
+        "failed": failed,
+        "arxiv": {
+            "ids": arxiv_ids,
+            "resolved": arxiv_resolved,
+            "unresolved": [arxiv_id for arxiv_id in arxiv_ids
+                           if arxiv_id not in arxiv_resolved and arxiv_id not in arxiv_failed_set],
+            "failed": arxiv_failed
+        },
+        "skipped_sources": skipped
+    }
+
+@singleflight.coalesced("semantic_scholar", "search")
+@sources.routed("semantic_scholar", fallback=list)
+@metrics.instrument()
 def search_semantic_scholar(query):
     """Search Semantic Scholar API for research papers."""
-    base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
+    base_url = f"{SEMANTIC_SCHOLAR_API_URL}/paper/search"
     params = {
         "query": query,
         "limit": 5
@@ -39,16 +343,19 @@ def search_semantic_scholar(query):
         "Accept": "application/json"
     }
 
-    response = requests.get(base_url, params=params, headers=headers)
+    response = http_client.get(base_url, params=params, headers=headers)
     if response.status_code == 200:
         data = response.json()
         return [{"title": paper.get("title", ""), "paperId": paper.get("paperId", "")} 
                 for paper in data.get("data", [])] if "data" in data else []
     return []
 
+@singleflight.coalesced("crossref", "retractions_by_query")
+@sources.routed("crossref", fallback=list)
+@metrics.instrument()
 def search_retracted_papers(query):
     """Check if a paper is retracted using CrossRef Retraction Watch API."""
-    base_url = "https://api.crossref.org/works"
+    base_url = f"{CROSSREF_API_URL}/works"
     
     # If query is a DOI, search directly
     if is_doi(query):
@@ -56,24 +363,27 @@ def search_retracted_papers(query):
     else:
         params = {"query.title": query, "filter": "type:retraction"}
 
-    response = requests.get(base_url, params=params)
+    response = http_client.get(base_url, params=params)
     if response.status_code == 200:
         data = response.json()
         return [{"title": item["title"][0], "doi": item["DOI"]} for item in data.get("message", {}).get("items", [])]
     return []
 
+@singleflight.coalesced("crossref", "work_by_doi")
+@sources.routed("crossref", fallback=list)
+@metrics.instrument()
 def search_crossref_by_doi(doi):
     """Search for a paper by DOI in CrossRef"""
     if not is_doi(doi):
         return []
         
-    base_url = f"https://api.crossref.org/works/{doi}"
+    base_url = f"{CROSSREF_API_URL}/works/{doi}"
     headers = {
         "User-Agent": "VerifAI/1.0"
     }
     
     try:
-        response = requests.get(base_url, headers=headers)
+        response = http_client.get(base_url, headers=headers)
         if response.status_code == 200:
             data = response.json()["message"]
             return [{
@@ -83,28 +393,43 @@ def search_crossref_by_doi(doi):
                 "year": data.get("published-print", {}).get("date-parts", [[""]])[0][0] if "published-print" in data else ""
             }]
     except Exception as e:
-        print(f"Error searching CrossRef: {e}")
+        print(f"Error searching CrossRef: {e}", file=sys.stderr)
     
     return []
 
+def verify(query):
+    """
+    Look the query up in every source and return the combined results.
+    Sources whose circuit breaker is open are listed under "skipped_sources".
+    """
+    with sources.tracking() as skipped:
+        # Additional check for DOI-specific searches
+        crossref_results = []
+        if is_doi(query):
+            crossref_results = search_crossref_by_doi(query)
+
+        results = {
+            "arxiv": search_arxiv(query),
+            "semantic_scholar": search_semantic_scholar(query),
+            "retracted": search_retracted_papers(query),
+            "crossref": crossref_results
+        }
+    results["skipped_sources"] = skipped
+    return results
+
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({"error": "Missing query argument"}))
         return
     
     query = sys.argv[1]
-    
-    # Additional check for DOI-specific searches
-    crossref_results = []
-    if is_doi(query):
-        crossref_results = search_crossref_by_doi(query)
-
-    results = {
-        "arxiv": search_arxiv(query),
-        "semantic_scholar": search_semantic_scholar(query),
-        "retracted": search_retracted_papers(query),
-        "crossref": crossref_results
-    }
+    if query == "--references":
+        # Bulk mode: a JSON list of references (strings or dicts) on stdin.
+        results = verify_references(json.load(sys.stdin))
+    else:
+        results = verify(query)
+    if metrics.ENABLED:
+        results["timings"] = metrics.snapshot()
 
     print(json.dumps(results))
 
@@ -5,20 +5,18 @@ import re
 import traceback
 from collections import defaultdict
 
-# Try importing optional dependencies with fallbacks
-try:
-    import fitz  # PyMuPDF for PDFs
-except ImportError:
-    fitz = None
+import metrics
+from near_duplicates import cluster_references
 
-try:
-    import docx
-except ImportError:
-    docx = None
+# PyMuPDF (fitz) and python-docx are optional and only imported by the
+# extractor that needs them, so TXT uploads never load either.
 
+@metrics.instrument(input_bytes=metrics.file_size, outcome=metrics.error_string_outcome)
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file with improved layout preservation."""
-    if fitz is None:
+    try:
+        import fitz  # PyMuPDF for PDFs
+    except ImportError:
         return "Error: PyMuPDF not installed. Run: pip install PyMuPDF"
     
     text = ""
@@ -39,9 +37,12 @@ def extract_text_from_pdf(pdf_path):
         return f"Error extracting PDF text: {e}"
     return text
 
+@metrics.instrument(input_bytes=metrics.file_size, outcome=metrics.error_string_outcome)
 def extract_text_from_docx(docx_path):
     """Extract text from a DOCX file with improved structure preservation."""
-    if docx is None:
+    try:
+        import docx
+    except ImportError:
         return "Error: python-docx not installed. Run: pip install python-docx"
     
     text = ""
@@ -81,6 +82,7 @@ def extract_text_from_docx(docx_path):
         return f"Error extracting DOCX text: {e}"
     return text
 
+@metrics.instrument(input_bytes=metrics.file_size, outcome=metrics.error_string_outcome)
 def extract_text_from_txt(txt_path):
     """Extract text from a TXT file."""
     try:
@@ -99,6 +101,7 @@ def extract_text_from_txt(txt_path):
     except Exception as e:
         return f"Error reading TXT file: {e}"
 
+@metrics.instrument(input_bytes=metrics.text_size)
 def extract_references(text):
     """
     Enhanced reference extraction with support for multiple citation styles.
@@ -151,6 +154,7 @@ def extract_references(text):
     
     return unique_references
 
+@metrics.instrument(input_bytes=metrics.text_size)
 def extract_metadata(text):
     """Extract metadata like title, authors, abstract, and keywords from the document."""
     metadata = {}
@@ -192,6 +196,7 @@ def extract_metadata(text):
     
     return metadata
 
+@metrics.instrument(input_bytes=metrics.text_size)
 def analyze_citation_patterns(text):
     """Analyze in-text citation patterns to identify citation style."""
     # Count occurrences of different citation patterns
@@ -218,6 +223,44 @@ def analyze_citation_patterns(text):
     
     return {"style": "unknown", "count": 0, "all_counts": dict(counts)}
 
+def process_file(file_path):
+    """Extract text, references, metadata and citation style from a document."""
+    file_ext = os.path.splitext(file_path)[1].lower()
+
+    if file_ext == ".pdf":
+        extracted_text = extract_text_from_pdf(file_path)
+    elif file_ext == ".docx":
+        extracted_text = extract_text_from_docx(file_path)
+    elif file_ext == ".txt":
+        extracted_text = extract_text_from_txt(file_path)
+    else:
+        return {"error": "Unsupported file format"}
+
+    # Extract various components
+    references = extract_references(extracted_text)
+    candidate_count = len(references)
+    with metrics.stage("cluster_references"):
+        # Merge near-duplicate variants so each reference is verified once.
+        references, reference_clusters = cluster_references(references)
+    metadata = extract_metadata(extracted_text)
+    citation_analysis = analyze_citation_patterns(extracted_text)
+    
+    # Prepare output
+    return {
+        "text": extracted_text,
+        "references": references,
+        "reference_dedup": {
+            "candidates": candidate_count,
+            "unique": len(references),
+            "lookups_avoided": candidate_count - len(references),
+            "clusters": reference_clusters
+        },
+        "metadata": metadata,
+        "citation_style": citation_analysis["style"],
+        "file_type": file_ext[1:],  # Remove the dot
+        "file_name": os.path.basename(file_path)
+    }
+
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No file path provided"}))
@@ -229,35 +272,10 @@ def main():
         print(json.dumps({"error": "File not found"}))
         return
 
-    file_ext = os.path.splitext(file_path)[1].lower()
-    extracted_text = ""
-
     try:
-        if file_ext == ".pdf":
-            extracted_text = extract_text_from_pdf(file_path)
-        elif file_ext == ".docx":
-            extracted_text = extract_text_from_docx(file_path)
-        elif file_ext == ".txt":
-            extracted_text = extract_text_from_txt(file_path)
-        else:
-            print(json.dumps({"error": "Unsupported file format"}))
-            return
-
-        # Extract various components
-        references = extract_references(extracted_text)
-        metadata = extract_metadata(extracted_text)
-        citation_analysis = analyze_citation_patterns(extracted_text)
-        
-        # Prepare output
-        output = {
-            "text": extracted_text,
-            "references": references,
-            "metadata": metadata,
-            "citation_style": citation_analysis["style"],
-            "file_type": file_ext[1:],  # Remove the dot
-            "file_name": os.path.basename(file_path)
-        }
-        
+        output = process_file(file_path)
+        if metrics.ENABLED:
+            output["timings"] = metrics.snapshot()
         print(json.dumps(output))
     except Exception as e:
         error_details = traceback.format_exc()
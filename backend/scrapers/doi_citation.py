@@ -1,37 +1,38 @@
 import json
-import requests
 import difflib
-from transformers import GPT2LMHeadModel, GPT2Tokenizer, pipeline
+import threading
+from endpoints import CROSSREF_API_URL, SEMANTIC_SCHOLAR_API_URL
+import metrics
+import singleflight
+import sources
+import http_client
+from check_paper import extract_dois, resolve_dois
 
 # Set your Hugging Face model repository ID.
 MODEL_REPO_ID = "carlinsj17/VerifAI"  # Replace with your actual Hugging Face repository ID.
 
+# The model is loaded on first use rather than at import, so callers that only
+# need metadata (get_combined_metadata, rank_references, ...) never pay for
+# importing torch/transformers or downloading the weights.
+_model = None
+_tokenizer = None
+_model_lock = threading.Lock()
 
-# Load your quantized model and tokenizer from Hugging Face.
-model = GPT2LMHeadModel.from_pretrained(MODEL_REPO_ID)
-tokenizer = GPT2Tokenizer.from_pretrained(MODEL_REPO_ID)
-# GPT-2 doesn't have a default pad token – we set it to the end-of-sentence token.
-if tokenizer.eos_token is None:
-    tokenizer.add_special_tokens({"eos_token": "</s>"})
-tokenizer.pad_token = tokenizer.eos_token
-
-# Since we are not using the Hugging Face Inference API, we define our own generate function.
-def generate_citation_for_paper(paper_info):
-    """
-    Build a prompt from the paper metadata and use your loaded GPT-2 model
-    directly (via the generate() method) to produce an IEEE-style citation.
-    """
-    prompt = (
-        f"Generate an IEEE citation for a paper with the following details:\n"
-        f"Title: {paper_info['title']}\n"
-        f"Authors: {', '.join(paper_info['authors'])}\n"
-        f"Year: {paper_info['year']}\n"
-        f"DOI: {paper_info['doi']}\n"
-    )
-    input_ids = tokenizer.encode(prompt, return_tensors="pt")
-    output_ids = model.generate(input_ids, max_length=128, num_return_sequences=1)
-    generated_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-    return generated_text.strip()
+def load_model():
+    """Load (once) and return your quantized GPT-2 model and tokenizer from Hugging Face."""
+    global _model, _tokenizer
+    with _model_lock:
+        if _model is None:
+            with metrics.stage("model.load"):
+                from transformers import GPT2LMHeadModel, GPT2Tokenizer
+                model = GPT2LMHeadModel.from_pretrained(MODEL_REPO_ID)
+                tokenizer = GPT2Tokenizer.from_pretrained(MODEL_REPO_ID)
+                # GPT-2 doesn't have a default pad token – we set it to the end-of-sentence token.
+                if tokenizer.eos_token is None:
+                    tokenizer.add_special_tokens({"eos_token": "</s>"})
+                tokenizer.pad_token = tokenizer.eos_token
+                _model, _tokenizer = model, tokenizer
+    return _model, _tokenizer
 
 def rank_references(main_title, main_abstract, references):
     """
@@ -52,6 +53,9 @@ def rank_references(main_title, main_abstract, references):
         ref["similarity_percentage"] = round(final_score * 100, 2)
     return sorted(references, key=lambda x: x.get("similarity_score", 0), reverse=True)
 
+@singleflight.coalesced("crossref", "paper_by_doi")
+@sources.routed("crossref", fallback=lambda: {"error": "CrossRef skipped: source unavailable."})
+@metrics.instrument()
 def get_paper_by_doi(doi):
     """
     Query CrossRef using the DOI to retrieve paper metadata.
@@ -60,13 +64,13 @@ def get_paper_by_doi(doi):
     """
     doi = doi.replace("https://doi.org/", "").strip()
     
-    url = f"https://api.crossref.org/works/{doi}"
+    url = f"{CROSSREF_API_URL}/works/{doi}"
     headers = {
         "User-Agent": "VerifAI/1.0"
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = http_client.get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()["message"]
             references = []
@@ -100,14 +104,17 @@ def get_paper_by_doi(doi):
     except Exception as e:
         return {"error": str(e)}
 
+@singleflight.coalesced("semantic_scholar", "paper_by_doi")
+@sources.routed("semantic_scholar", fallback=lambda: {"error": "Semantic Scholar skipped: source unavailable."})
+@metrics.instrument()
 def get_paper_by_doi_semantic(doi):
     """
     Fallback method: Query Semantic Scholar using the DOI to retrieve metadata.
     """
     doi = doi.replace("https://doi.org/", "").strip()
-    base_url = f"https://api.semanticscholar.org/graph/v1/paper/DOI:{doi}?fields=title,authors,year,abstract"
+    base_url = f"{SEMANTIC_SCHOLAR_API_URL}/paper/DOI:{doi}?fields=title,authors,year,abstract"
     try:
-        response = requests.get(base_url)
+        response = http_client.get(base_url)
         if response.status_code == 200:
             data = response.json()
             authors = [author.get("name", "") for author in data.get("authors", [])]
@@ -145,16 +152,19 @@ def get_combined_metadata(doi):
             crossref_data["year"] = semantic_data["year"]
     return crossref_data
 
+@singleflight.coalesced("crossref", "retractions_by_title")
+@sources.routed("crossref", fallback=list)
+@metrics.instrument()
 def search_retracted_papers(title):
     """
     Use CrossRef to search for papers that have been retracted,
     matching approximately the given title.
     Returns a list of dictionaries with title and DOI.
     """
-    base_url = "https://api.crossref.org/works"
+    base_url = f"{CROSSREF_API_URL}/works"
     params = {"query.title": title, "filter": "type:retraction"}
     try:
-        response = requests.get(base_url, params=params)
+        response = http_client.get(base_url, params=params)
         if response.status_code == 200:
             data = response.json()
             items = data.get("message", {}).get("items", [])
@@ -164,10 +174,37 @@ def search_retracted_papers(title):
     except Exception as e:
         return []
 
+def check_reference_dois(references):
+    """
+    Resolve the DOIs of a reference list in a few batched CrossRef queries and
+    mark each reference with "doi_resolved" and "is_retracted". Both are left
+    unset for references whose lookup failed, so an outage never reads as a
+    missing DOI.
+    """
+    resolved, failed = resolve_dois(extract_dois(references))
+    failed = set(failed)
+    for ref in references:
+        dois = extract_dois([ref])
+        if not dois:
+            continue
+        ref["doi"] = ref.get("doi") or dois[0]
+        if dois[0] in failed:
+            continue
+        work = resolved.get(dois[0])
+        ref["doi_resolved"] = work is not None
+        if work is None:
+            ref["is_retracted"] = False
+        elif work["is_retracted"] is not None:
+            ref["is_retracted"] = work["is_retracted"]
+        if ref.get("is_retracted"):
+            ref["retraction_info"] = work["retraction_info"]
+    return references
+
 def generate_citation_for_paper(paper_info):
     """
     Build a prompt from the paper metadata and then generate an IEEE-style citation
     by directly using your quantized GPT-2 model's generate() method.
+    Since we are not using the Hugging Face Inference API, we call generate() ourselves.
     """
     prompt = (
         f"Generate an IEEE citation for a paper with the following details:\n"
@@ -176,13 +213,25 @@ def generate_citation_for_paper(paper_info):
         f"Year: {paper_info['year']}\n"
         f"DOI: {paper_info['doi']}\n"
     )
+    model, tokenizer = load_model()
     input_ids = tokenizer.encode(prompt, return_tensors="pt")
-    output_ids = model.generate(input_ids, max_length=128, num_return_sequences=1)
+    with metrics.stage("model.generate"):
+        output_ids = model.generate(input_ids, max_length=128, num_return_sequences=1)
+        metrics.note(input_tokens=input_ids.shape[-1], output_tokens=output_ids.shape[-1] - input_ids.shape[-1])
     generated_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
     return generated_text.strip()
 
 def main(doi):
     """Fetch metadata, generate citation, check for retractions, and output as JSON."""
+    with sources.tracking() as skipped:
+        result = analyze_doi(doi)
+    result["skipped_sources"] = skipped
+    if metrics.ENABLED:
+        result["timings"] = metrics.snapshot()
+    return result
+
+def analyze_doi(doi):
+    """Fetch metadata, generate citation and check for retractions."""
     paper_info = get_combined_metadata(doi)
     if not paper_info or "error" in paper_info:
         return {"success": False, "error": paper_info.get("error", "Paper not found")}
@@ -193,6 +242,7 @@ def main(doi):
     paper_info["is_retracted"] = len(retracted_results) > 0
     if paper_info["is_retracted"]:
         paper_info["retraction_info"] = retracted_results
+    check_reference_dois(paper_info["references"])
     return {"success": True, "paper": paper_info}
 
 if __name__ == "__main__":
@@ -0,0 +1,14 @@
+import os
+
+# Base URLs for the external metadata APIs used by the scrapers.
+# Each one can be overridden through the environment, which is how the
+# offline benchmark suite (backend/benchmarks) points the scrapers at its
+# local stub server instead of the live services.
+ARXIV_API_URL = os.environ.get("VERIFAI_ARXIV_URL", "http://export.arxiv.org/api/query")
+SEMANTIC_SCHOLAR_API_URL = os.environ.get("VERIFAI_SEMANTIC_SCHOLAR_URL", "https://api.semanticscholar.org/graph/v1")
+CROSSREF_API_URL = os.environ.get("VERIFAI_CROSSREF_URL", "https://api.crossref.org")
+OPENLIBRARY_API_URL = os.environ.get("VERIFAI_OPENLIBRARY_URL", "https://openlibrary.org")
+
+# (connect, read) timeout in seconds for every upstream request, so a
+# degraded provider cannot stall a verification indefinitely.
+REQUEST_TIMEOUT = (3.05, float(os.environ.get("VERIFAI_HTTP_TIMEOUT", "10")))
@@ -0,0 +1,20 @@
+import requests
+
+import metrics
+import singleflight
+import sources
+from endpoints import REQUEST_TIMEOUT
+
+def get(url, **kwargs):
+    """
+    requests.get with the default timeout, reporting the request to the
+    single-flight call counter and the response to the stage metrics, the
+    single-flight negative cache and the source router.
+    """
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    singleflight.note_request()
+    response = requests.get(url, **kwargs)
+    metrics.note_response(response, streamed=kwargs.get("stream", False))
+    singleflight.note_response(response)
+    sources.note_response(response)
+    return response
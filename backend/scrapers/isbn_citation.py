@@ -1,10 +1,33 @@
-from transformers import pipeline
-import requests
+import threading
+from endpoints import OPENLIBRARY_API_URL
+import metrics
+import sources
+import http_client
 
+# Hugging Face model used to format book citations.
+CITATION_MODEL_ID = "scieditor/citation-generation-t5"
+
+# transformers is imported and the pipeline built on first use, so an ISBN
+# that OpenLibrary does not know never pays for loading the model.
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def load_pipeline():
+    """Build (once) and return the citation text2text-generation pipeline."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            with metrics.stage("model.load"):
+                from transformers import pipeline
+                _pipeline = pipeline("text2text-generation", model=CITATION_MODEL_ID)
+    return _pipeline
+
+@sources.routed("openlibrary", fallback=lambda: {"success": False})
+@metrics.instrument()
 def search_isbn(isbn):
     """Search OpenLibrary API for book details using ISBN."""
-    url = f"https://openlibrary.org/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
-    response = requests.get(url)
+    url = f"{OPENLIBRARY_API_URL}/api/books?bibkeys=ISBN:{isbn}&format=json&jscmd=data"
+    response = http_client.get(url)
     if response.status_code == 200:
         data = response.json()
         key = f"ISBN:{isbn}"
@@ -21,14 +44,25 @@ def search_isbn(isbn):
 
 def generate_citation(book_info):
     """Generate citation using HuggingFace model."""
-    pipe = pipeline("text2text-generation", model="scieditor/citation-generation-t5")
+    pipe = load_pipeline()
     
     input_text = f"generate citation for: {book_info['title']} by {', '.join(book_info['authors'])} published in {book_info['publish_date']} by {book_info['publisher']}"
     
-    citation = pipe(input_text, max_length=512, num_return_sequences=1)[0]['generated_text']
+    with metrics.stage("model.generate"):
+        citation = pipe(input_text, max_length=512, num_return_sequences=1)[0]['generated_text']
+        if metrics.ENABLED:
+            metrics.note(input_tokens=len(pipe.tokenizer.encode(input_text)), output_tokens=len(pipe.tokenizer.encode(citation)))
     return citation
 
 def main(isbn):
+    with sources.tracking() as skipped:
+        result = cite_isbn(isbn)
+    result["skipped_sources"] = skipped
+    if metrics.ENABLED:
+        result["timings"] = metrics.snapshot()
+    return result
+
+def cite_isbn(isbn):
     book_info = search_isbn(isbn)
     if book_info["success"]:
         citation = generate_citation(book_info)
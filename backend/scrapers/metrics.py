@@ -0,0 +1,388 @@
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import shared_state
+
+# Opt-in per-stage instrumentation for the scraper pipeline.
+#
+# Set VERIFAI_TIMINGS=1 (or call enable()) to record the duration, byte
+# counts and outcome of each instrumented stage. The scrapers then attach
+# snapshot() to their JSON output under "timings". When disabled, stages cost
+# a single flag check.
+#
+# The server runs every scraper as a short-lived process, so at exit each
+# process adds its aggregates (stage histograms when enabled, the free-form
+# counters always) to metrics.json in the shared directory under a file lock
+# (VERIFAI_METRICS_FILE overrides the path). `python3 metrics.py` prints the
+# accumulated totals in Prometheus text format; server.js serves that at
+# /metrics. Long-running processes can also expose their own aggregates with
+# render_prometheus() or start_metrics_server().
+
+ENABLED = os.environ.get("VERIFAI_TIMINGS", "").lower() not in ("", "0", "false", "no")
+
+# Upper bounds (seconds) of the duration histogram buckets.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Cap on the per-call records kept for snapshot(); aggregates are unbounded.
+MAX_RECORDS = 1000
+
+METRICS_FILE = os.environ.get("VERIFAI_METRICS_FILE") or shared_state.path("metrics.json")
+
+_lock = threading.Lock()
+_local = threading.local()
+_records = []
+_calls = defaultdict(int)             # (stage, outcome) -> count
+_duration_sum = defaultdict(float)    # stage -> seconds
+_duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+_bytes = defaultdict(int)             # (stage, direction) -> bytes
+_http_status = defaultdict(int)       # (stage, status) -> count
+_tokens = defaultdict(int)            # (stage, kind) -> tokens
+_counters = defaultdict(int)          # (name, labels) -> count, always recorded
+_counter_help = {}                    # name -> help text
+
+# Aggregate tables persisted to METRICS_FILE, by name.
+_TABLES = {
+    "calls": _calls,
+    "duration_sum": _duration_sum,
+    "duration_buckets": _duration_buckets,
+    "bytes": _bytes,
+    "http_status": _http_status,
+    "tokens": _tokens,
+    "counters": _counters,
+}
+
+
+def enable(value=True):
+    """Turn instrumentation on or off for this process."""
+    global ENABLED
+    ENABLED = value
+
+
+def reset():
+    """Drop all recorded stages and aggregates."""
+    with _lock:
+        _records.clear()
+        for table in (_calls, _duration_sum, _duration_buckets, _bytes, _http_status, _tokens, _counters):
+            table.clear()
+
+
+def _current():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def note(**fields):
+    """Attach fields (status, bytes_in, bytes_out, input_tokens, ...) to the running stage."""
+    record = _current()
+    if record is not None:
+        record.update(fields)
+
+
+def note_response(response, streamed=False):
+    """
+    Record the HTTP status and body size of a requests response on the
+    running stage. The body of a streamed response is not read here; its
+    consumer notes bytes_in itself.
+    """
+    record = _current()
+    if record is None:
+        return
+    record["status"] = response.status_code
+    if not streamed:
+        record["bytes_in"] = len(response.content)
+    if response.status_code != 200:
+        record["outcome"] = "http_error"
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as one stage; exceptions mark it as an error."""
+    if not ENABLED:
+        yield
+        return
+    record = {"stage": name, "outcome": "ok"}
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        record["outcome"] = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        record["duration_ms"] = round(duration * 1000.0, 3)
+        _store(record, duration)
+
+
+def instrument(name=None, input_bytes=None, outcome=None):
+    """
+    Decorator form of stage(). input_bytes(*args, **kwargs) may return the
+    size of the input; outcome(result) may classify the return value. String
+    results are counted as bytes_out.
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with stage(stage_name):
+                if input_bytes is not None:
+                    note(bytes_in=input_bytes(*args, **kwargs))
+                result = func(*args, **kwargs)
+                if isinstance(result, str):
+                    note(bytes_out=len(result.encode("utf-8", "replace")))
+                if outcome is not None:
+                    note(outcome=outcome(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def file_size(path, *args, **kwargs):
+    """input_bytes helper for functions whose first argument is a file path."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def text_size(text, *args, **kwargs):
+    """input_bytes helper for functions whose first argument is text."""
+    return len(text.encode("utf-8", "replace")) if text else 0
+
+
+def error_string_outcome(result):
+    """outcome helper for extractors that report failures as "Error..." strings."""
+    return "error" if isinstance(result, str) and result.startswith("Error") else "ok"
+
+
+def _store(record, duration):
+    name = record["stage"]
+    with _lock:
+        if len(_records) < MAX_RECORDS:
+            _records.append(record)
+        _calls[(name, record["outcome"])] += 1
+        _duration_sum[name] += duration
+        buckets = _duration_buckets[name]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                buckets[i] += 1
+        for direction in ("in", "out"):
+            if f"bytes_{direction}" in record:
+                _bytes[(name, direction)] += record[f"bytes_{direction}"]
+        if "status" in record:
+            _http_status[(name, record["status"])] += 1
+        for kind in ("input", "output"):
+            if f"{kind}_tokens" in record:
+                _tokens[(name, kind)] += record[f"{kind}_tokens"]
+
+
+def snapshot():
+    """Per-call stage records, in completion order, for the JSON "timings" field."""
+    with _lock:
+        return [dict(record) for record in _records]
+
+
+def describe_counter(name, help_text):
+    """Register the HELP text rendered for a counter created with inc()."""
+    _counter_help[name] = help_text
+
+
+def inc(name, amount=1, **labels):
+    """
+    Increment a free-form counter. Unlike stages these are recorded even when
+    instrumentation is disabled, since they are only a dictionary update.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] += amount
+
+
+def counters():
+    """Current free-form counter values keyed by 'name{labels}'."""
+    with _lock:
+        return {f"{name}{{{_labels(**dict(labels))}}}": value for (name, labels), value in sorted(_counters.items())}
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{str(value)}"' for key, value in labels.items())
+
+
+def render_prometheus():
+    """Render the aggregates in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        lines.append("# HELP verifai_stage_duration_seconds Time spent in each scraper stage.")
+        lines.append("# TYPE verifai_stage_duration_seconds histogram")
+        for name in sorted(_duration_sum):
+            count = sum(n for (stage_name, _), n in _calls.items() if stage_name == name)
+            for bound, n in zip(DURATION_BUCKETS, _duration_buckets[name]):
+                lines.append(f"verifai_stage_duration_seconds_bucket{{{_labels(stage=name, le=bound)}}} {n}")
+            lines.append(f'verifai_stage_duration_seconds_bucket{{{_labels(stage=name, le="+Inf")}}} {count}')
+            lines.append(f"verifai_stage_duration_seconds_sum{{{_labels(stage=name)}}} {_duration_sum[name]}")
+            lines.append(f"verifai_stage_duration_seconds_count{{{_labels(stage=name)}}} {count}")
+
+        lines.append("# HELP verifai_stage_calls_total Stage invocations by outcome.")
+        lines.append("# TYPE verifai_stage_calls_total counter")
+        for (name, result), n in sorted(_calls.items()):
+            lines.append(f"verifai_stage_calls_total{{{_labels(stage=name, outcome=result)}}} {n}")
+
+        lines.append("# HELP verifai_stage_bytes_total Bytes read (in) and produced (out) per stage.")
+        lines.append("# TYPE verifai_stage_bytes_total counter")
+        for (name, direction), n in sorted(_bytes.items()):
+            lines.append(f"verifai_stage_bytes_total{{{_labels(stage=name, direction=direction)}}} {n}")
+
+        lines.append("# HELP verifai_http_responses_total Upstream HTTP responses by status code.")
+        lines.append("# TYPE verifai_http_responses_total counter")
+        for (name, status), n in sorted(_http_status.items()):
+            lines.append(f"verifai_http_responses_total{{{_labels(stage=name, status=status)}}} {n}")
+
+        lines.append("# HELP verifai_model_tokens_total Tokens consumed (input) and generated (output) by the models.")
+        lines.append("# TYPE verifai_model_tokens_total counter")
+        for (name, kind), n in sorted(_tokens.items()):
+            lines.append(f"verifai_model_tokens_total{{{_labels(stage=name, kind=kind)}}} {n}")
+
+        for counter_name in sorted({name for name, _ in _counters}):
+            lines.append(f"# HELP {counter_name} {_counter_help.get(counter_name, counter_name)}")
+            lines.append(f"# TYPE {counter_name} counter")
+            for (name, labels), n in sorted(_counters.items()):
+                if name == counter_name:
+                    lines.append(f"{name}{{{_labels(**dict(labels))}}} {n}")
+    return "\n".join(lines) + "\n"
+
+
+def _freeze(key):
+    """JSON turns tuple keys into lists; turn them back (recursively)."""
+    return tuple(_freeze(part) for part in key) if isinstance(key, list) else key
+
+
+def _new_tables():
+    """Empty tables shaped like _TABLES."""
+    tables = {name: defaultdict(int) for name in _TABLES}
+    tables["duration_sum"] = defaultdict(float)
+    tables["duration_buckets"] = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+    return tables
+
+
+def _merge(tables, data):
+    """Add aggregates in METRICS_FILE format to tables."""
+    for name, table in tables.items():
+        for key, value in data.get(name, []):
+            key = _freeze(key)
+            if isinstance(value, list):
+                buckets = table[key]
+                for i, n in enumerate(value[:len(buckets)]):
+                    buckets[i] += n
+            else:
+                table[key] += value
+
+
+def _dump(tables):
+    """tables in METRICS_FILE format."""
+    return {name: [[key, list(value) if isinstance(value, list) else value] for key, value in table.items()]
+            for name, table in tables.items()}
+
+
+def persist(path=None):
+    """
+    Add this process's aggregates to the shared metrics file and clear them
+    here, so calling it again (or at exit) never counts anything twice.
+    """
+    path = path or METRICS_FILE
+    if not path:
+        return
+    with shared_state.locked(path) as acquired:
+        if not acquired:
+            # Keep the aggregates here; render_prometheus() still sees them.
+            return
+        with _lock:
+            if not any(_TABLES.values()):
+                return
+            mine = _dump(_TABLES)
+            help_texts = dict(_counter_help)
+            for table in _TABLES.values():
+                table.clear()
+        totals = shared_state.read_json(path, {})
+        tables = _new_tables()
+        _merge(tables, totals)
+        _merge(tables, mine)
+        data = _dump(tables)
+        data["counter_help"] = dict(totals.get("counter_help", {}), **help_texts)
+        shared_state.write_json(path, data)
+
+
+def load(path=None):
+    """Add the totals accumulated in the shared metrics file to this process's aggregates."""
+    path = path or METRICS_FILE
+    if not path:
+        return
+    with shared_state.locked(path) as acquired:
+        totals = shared_state.read_json(path, {}) if acquired else {}
+    with _lock:
+        _merge(_TABLES, totals)
+        for name, help_text in totals.get("counter_help", {}).items():
+            _counter_help.setdefault(name, help_text)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve render_prometheus() on http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+_persist_at_exit = True
+
+
+def _persist_on_exit():
+    if _persist_at_exit:
+        persist()
+
+
+atexit.register(_persist_on_exit)
+
+
+def main():
+    """Print the totals of every scraper process so far in Prometheus text format."""
+    global _persist_at_exit
+    # This process only reads the totals; writing them back would double them.
+    _persist_at_exit = False
+    if METRICS_FILE is None:
+        print("Metrics persistence is disabled (no shared directory).", file=sys.stderr)
+    load()
+    sys.stdout.write(render_prometheus())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import random
+import re
+import sys
+import zlib
+
+# Near-duplicate reference clustering with MinHash signatures and LSH banding.
+#
+# The reference patterns in document_scraper overlap, so the same reference is
+# often extracted several times with small differences (numbering, line
+# breaks, punctuation). Each reference is reduced to character shingles,
+# summarized by a MinHash signature, and bucketed by bands of that signature;
+# only references sharing a bucket are compared, which keeps the whole stage
+# roughly linear in the number of references.
+#
+# Similar text alone is not enough to merge: a copy of a real reference with a
+# different year, volume, page range, DOI or arXiv id is exactly what a
+# fabricated citation looks like, so both references must also contain the
+# same set of numbers.
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 60
+BANDS = 10  # 10 bands x 6 rows: ~95% of pairs at 0.8 Jaccard collide, ~15% at 0.5
+SIMILARITY_THRESHOLD = 0.8
+
+# numpy vectorizes the signature computation; the pure-Python fallback gives
+# identical signatures, just more slowly. Importing numpy costs about as much
+# as hashing a few thousand shingles in Python, so it is only loaded when the
+# references hold more than that (or when something else already loaded it).
+NUMPY_MIN_SHINGLES = 2000
+
+# Multiply-shift hashing: h -> ((a * h + b) mod 2^64) >> 32 with odd a.
+_MASK_64 = (1 << 64) - 1
+
+_rng = random.Random(20240401)  # Fixed seed so signatures are stable across runs
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(NUM_PERMUTATIONS)]
+_numpy = None  # (module, a, b) once loaded, False if unavailable
+
+_NUMBERING = re.compile(r"^\s*(?:\[\d{1,3}\]|\d{1,3}\.)\s*")
+_NON_WORD = re.compile(r"[^\w]+")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_reference(reference):
+    """Lowercase, drop the leading [n] / n. numbering and collapse punctuation."""
+    reference = _NUMBERING.sub("", reference)
+    return _NON_WORD.sub(" ", reference.lower()).strip()
+
+
+def numeric_tokens(text):
+    """Set of digit runs (years, volume, pages, DOI/arXiv id parts) in the text."""
+    return frozenset(_DIGITS.findall(text))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of hashed character shingles of the text."""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy as np
+            a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+            b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64).reshape(-1, 1)
+            _numpy = (np, a, b)
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def minhash(shingle_hashes, vectorized=None):
+    """MinHash signature of a set of shingle hashes."""
+    if vectorized is not None:
+        np, a, b = vectorized
+        hashes = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+        with np.errstate(over="ignore"):
+            permuted = (a * hashes + b) >> np.uint64(32)
+        return tuple(permuted.min(axis=1).tolist())
+    # The shift is monotonic, so it can be applied once to the minimum.
+    return tuple(
+        min((a * h + b) & _MASK_64 for h in shingle_hashes) >> 32
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimated_similarity(signature_a, signature_b):
+    """Fraction of agreeing MinHash slots, an estimate of the Jaccard similarity."""
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def cluster_references(references, threshold=SIMILARITY_THRESHOLD):
+    """
+    Group near-duplicate references: MinHash similarity of at least threshold
+    and the same numeric tokens. Returns (unique_references, clusters)
+    where unique_references keeps the first variant of each cluster in the
+    original order, and clusters lists, for every unique reference that
+    absorbed others, its index in unique_references and the merged variants.
+    """
+    normalized = [normalize_reference(ref) for ref in references]
+    numbers = [numeric_tokens(text) for text in normalized]
+    shingle_sets = [shingles(text) for text in normalized]
+    use_numpy = "numpy" in sys.modules or sum(map(len, shingle_sets)) >= NUMPY_MIN_SHINGLES
+    vectorized = _load_numpy() if use_numpy else None
+    signatures = [minhash(shingle_set, vectorized) for shingle_set in shingle_sets]
+    parent = list(range(len(references)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERMUTATIONS // BANDS
+    compared = set()
+    for band in range(BANDS):
+        buckets = {}
+        for i, signature in enumerate(signatures):
+            buckets.setdefault(signature[band * rows:(band + 1) * rows], []).append(i)
+        for members in buckets.values():
+            for n, i in enumerate(members):
+                for j in members[:n]:
+                    root_i, root_j = find(i), find(j)
+                    if root_i == root_j or (j, i) in compared:
+                        continue
+                    compared.add((j, i))
+                    if numbers[i] == numbers[j] and estimated_similarity(signatures[i], signatures[j]) >= threshold:
+                        # Keep the earliest reference as the cluster root.
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    unique_references = []
+    position = {}
+    variants = {}
+    for i, ref in enumerate(references):
+        root = find(i)
+        if root == i:
+            position[i] = len(unique_references)
+            unique_references.append(ref)
+        else:
+            variants.setdefault(root, []).append(ref)
+
+    clusters = [{"reference": position[root], "variants": merged} for root, merged in sorted(variants.items())]
+    return unique_references, clusters
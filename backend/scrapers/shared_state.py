@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, state stays per process
+    fcntl = None
+
+# Small JSON files shared between scraper processes.
+#
+# The server spawns one Python process per request, so anything that should
+# outlive a single lookup (coalesced results, the not-found cache, circuit
+# breaker state) has to live on disk. Files are kept in VERIFAI_SHARED_DIR
+# (default: a "verifai" directory under the system temp dir) and every
+# read-modify-write happens under an exclusive flock on a sibling ".lock" file.
+# Setting VERIFAI_SHARED_DIR to an empty string, running without fcntl, or a
+# directory that cannot be used (not writable, not a directory, ...) keeps all
+# state inside the process: path() returns None and locked() yields False.
+
+SHARED_DIR = os.environ.get("VERIFAI_SHARED_DIR", os.path.join(tempfile.gettempdir(), "verifai"))
+ENABLED = bool(SHARED_DIR) and fcntl is not None
+
+
+def path(*parts):
+    """
+    Path of a file in the shared directory, creating its parent if needed.
+    None when sharing is disabled or the directory is unusable.
+    """
+    if not ENABLED:
+        return None
+    full_path = os.path.join(SHARED_DIR, *parts)
+    try:
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    except OSError:
+        return None
+    return full_path
+
+
+@contextmanager
+def locked(file_path, blocking=True):
+    """
+    Hold an exclusive lock for file_path (on file_path + ".lock") and yield
+    True. Yields False instead when the lock cannot be taken: with
+    blocking=False because another holder has it, or because the lock file
+    cannot be opened or locked at all.
+    """
+    if not file_path or fcntl is None:
+        yield False
+        return
+    lock_path = file_path + ".lock"
+    while True:
+        try:
+            lock_file = open(lock_path, "a")
+        except OSError:
+            yield False
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            # remove() may have unlinked the lock file while we waited on it;
+            # a lock on the old inode excludes nobody, so start over.
+            current = os.stat(lock_path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except OSError:
+            lock_file.close()
+            yield False
+            return
+        if current:
+            break
+        lock_file.close()
+    try:
+        yield True
+    finally:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+
+def remove(file_path):
+    """Delete file_path and its lock file. Only call while holding locked(file_path)."""
+    for target in (file_path, file_path + ".lock"):
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+
+
+def read_json(file_path, default=None):
+    try:
+        with open(file_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(file_path, data):
+    # Write-then-rename so readers that skip the lock never see a torn file.
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, file_path)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
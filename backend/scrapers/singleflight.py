@@ -0,0 +1,275 @@
+import copy
+import functools
+import hashlib
+import os
+import re
+import threading
+import time
+
+import metrics
+import shared_state
+
+# In-flight request coalescing ("single flight") and negative caching for the
+# metadata lookups.
+#
+# When several callers ask the same lookup for the same normalized query at
+# the same time, only the first one (the leader) calls upstream; the others
+# wait for it and receive a copy of its result. Not-found answers are also
+# remembered for VERIFAI_NEGATIVE_CACHE_TTL seconds so that a reading list
+# full of the same bad DOI does not hit the APIs over and over.
+#
+# This works at two levels: threads of one process share an in-memory leader,
+# and, because the server spawns one scraper process per request, that leader
+# in turn coordinates with other processes through a flock-guarded result file
+# per key in the shared directory (see shared_state.py). A process that finds
+# the key locked waits for the lock and reuses the answer the holder wrote.
+# Only not-found answers (for the TTL) and keys still in flight need those
+# files: other answers are kept SHARED_RESULT_SECONDS for the waiters, and at
+# most every PRUNE_INTERVAL seconds a lookup sweeps out expired entries and
+# their lock files. Without a usable shared directory only in-process
+# callers benefit.
+#
+# The upstream calls made and saved are exported through metrics.inc(),
+# labelled with the provider (source) and the lookup:
+#   verifai_upstream_calls_total{source,lookup}      calls that sent a request upstream
+#   verifai_coalesced_calls_total{source,lookup}     calls that shared a leader's result
+#   verifai_negative_cache_hits_total{source,lookup} calls answered from the negative cache
+
+NEGATIVE_CACHE_TTL = float(os.environ.get("VERIFAI_NEGATIVE_CACHE_TTL", "30"))
+SHARED_RESULT_SECONDS = 10
+PRUNE_INTERVAL = 60
+
+metrics.describe_counter("verifai_upstream_calls_total", "Lookups that sent a request to the upstream API.")
+metrics.describe_counter("verifai_coalesced_calls_total", "Lookups that shared an identical in-flight request.")
+metrics.describe_counter("verifai_negative_cache_hits_total", "Lookups answered from the not-found cache.")
+
+_DOI_PREFIX = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)", re.IGNORECASE)
+
+_local = threading.local()
+
+
+def normalize_query(query):
+    """Normalize a DOI or title so trivially different spellings share a key."""
+    query = _DOI_PREFIX.sub("", (query or "").strip())
+    return re.sub(r"\s+", " ", query).strip().rstrip(".").casefold()
+
+
+def note_request():
+    """
+    Count the running lookup as an upstream call when it sends its first
+    request, so lookups skipped by an open circuit breaker are not counted.
+    """
+    lookup = getattr(_local, "lookup", None)
+    if lookup is not None:
+        _local.lookup = None
+        metrics.inc("verifai_upstream_calls_total", source=lookup[0], lookup=lookup[1])
+
+
+def note_response(response):
+    """
+    Tell the running lookup which HTTP status it got. Only answers the
+    upstream actually gave (200 with no results, or 404) are negative-cached;
+    throttling and server errors are not.
+    """
+    _local.cacheable = response.status_code in (200, 404)
+
+
+def is_not_found(result):
+    """Default test for a not-found answer: no results, or an error dict."""
+    return not result or (isinstance(result, dict) and "error" in result)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls per key and caches negative results."""
+
+    def __init__(self, negative_ttl=NEGATIVE_CACHE_TTL, shared=shared_state.ENABLED):
+        self.negative_ttl = negative_ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._negative = {}  # key -> (expires_at, result)
+
+    def do(self, source, lookup, key, fn, is_negative=is_not_found):
+        """Return fn() for key, sharing the work with identical concurrent calls."""
+        cache_key = (source, lookup, key)
+        with self._lock:
+            cached = self._negative.get(cache_key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    metrics.inc("verifai_negative_cache_hits_total", source=source, lookup=lookup)
+                    return copy.deepcopy(cached[1])
+                del self._negative[cache_key]
+
+            call = self._in_flight.get(cache_key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[cache_key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            metrics.inc("verifai_coalesced_calls_total", source=source, lookup=lookup)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        cacheable = False
+        try:
+            if self.shared:
+                result, cacheable = self._shared_do(source, lookup, key, fn, is_negative)
+            else:
+                result, cacheable = self._call(source, lookup, fn)
+            call.result = result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[cache_key]
+                if call.error is None:
+                    # Snapshot before waking anyone: the leader is free to
+                    # mutate its own result as soon as it returns.
+                    if call.waiters:
+                        call.result = copy.deepcopy(call.result)
+                    if self.negative_ttl > 0 and cacheable and is_negative(call.result):
+                        self._negative[cache_key] = (time.monotonic() + self.negative_ttl, copy.deepcopy(call.result))
+            call.done.set()
+        return result
+
+    def _call(self, source, lookup, fn):
+        """Call upstream; returns (result, whether the answer may be negative-cached)."""
+        # Stays False unless the lookup reports an upstream answer, so
+        # swallowed connection errors are never negative-cached.
+        _local.cacheable = False
+        _local.lookup = (source, lookup)
+        try:
+            result = fn()
+        finally:
+            _local.lookup = None
+        return result, _local.cacheable
+
+    def _shared_do(self, source, lookup, key, fn, is_negative):
+        """Coalesce with other processes through the key's result file."""
+        digest = hashlib.sha1(f"{source}\0{lookup}\0{key}".encode("utf-8")).hexdigest()
+        file_path = shared_state.path("singleflight", digest + ".json")
+        if file_path is None:
+            return self._call(source, lookup, fn)
+        try:
+            return self._shared_fetch(source, lookup, file_path, fn, is_negative)
+        finally:
+            self._prune(os.path.dirname(file_path))
+
+    def _shared_fetch(self, source, lookup, file_path, fn, is_negative):
+        started = time.time()
+        entry = shared_state.read_json(file_path)
+        if entry and entry["negative_until"] > started:
+            metrics.inc("verifai_negative_cache_hits_total", source=source, lookup=lookup)
+            return entry["result"], True
+
+        with shared_state.locked(file_path, blocking=False) as acquired:
+            if acquired:
+                return self._shared_lead(source, lookup, file_path, fn, is_negative)
+
+        # Another process is fetching the same key: wait for it and reuse its
+        # answer. If it wrote none (it failed, or the result was not JSON),
+        # fetch it ourselves while holding the lock; if the lock cannot be
+        # taken at all, fetch without it.
+        with shared_state.locked(file_path) as acquired:
+            if not acquired:
+                return self._call(source, lookup, fn)
+            entry = shared_state.read_json(file_path)
+            if entry and entry["written_at"] >= started:
+                metrics.inc("verifai_coalesced_calls_total", source=source, lookup=lookup)
+                return entry["result"], entry["negative_until"] > 0
+            return self._shared_lead(source, lookup, file_path, fn, is_negative)
+
+    def _shared_lead(self, source, lookup, file_path, fn, is_negative):
+        """Fetch while holding the key's lock and publish the answer."""
+        entry = shared_state.read_json(file_path)
+        if entry and entry["negative_until"] > time.time():
+            # Written by a process that finished just before we locked.
+            metrics.inc("verifai_negative_cache_hits_total", source=source, lookup=lookup)
+            return entry["result"], True
+        result, cacheable = self._call(source, lookup, fn)
+        now = time.time()
+        negative = self.negative_ttl > 0 and cacheable and is_negative(result)
+        shared_state.write_json(file_path, {
+            "written_at": now,
+            "negative_until": now + self.negative_ttl if negative else 0,
+            "result": result
+        })
+        return result, cacheable
+
+    def _prune(self, directory, force=False):
+        """
+        Remove shared entries that are neither in flight nor a live negative
+        answer, with their lock files. Runs at most every PRUNE_INTERVAL
+        seconds across all processes unless forced.
+        """
+        now = time.time()
+        marker = os.path.join(directory, ".last_prune")
+        try:
+            if not force and now - os.path.getmtime(marker) < PRUNE_INTERVAL:
+                return
+        except OSError:
+            pass
+        try:
+            with open(marker, "a"):
+                pass
+            os.utime(marker, (now, now))
+            names = os.listdir(directory)
+        except OSError:
+            return
+        entries = {os.path.join(directory, name[:-len(".lock")] if name.endswith(".lock") else name)
+                   for name in names if name.endswith((".json", ".json.lock"))}
+        for file_path in entries:
+            with shared_state.locked(file_path, blocking=False) as acquired:
+                if not acquired:
+                    continue  # in flight
+                entry = shared_state.read_json(file_path)
+                if (force or not entry or (entry.get("negative_until", 0) <= now
+                                           and entry.get("written_at", 0) + SHARED_RESULT_SECONDS <= now)):
+                    shared_state.remove(file_path)
+
+    def clear(self):
+        """Forget all negative-cache entries, including the shared ones."""
+        with self._lock:
+            self._negative.clear()
+        if self.shared:
+            directory = shared_state.path("singleflight", "")
+            if directory is not None:
+                self._prune(directory, force=True)
+
+
+_default = SingleFlight()
+
+
+def coalesced(source, lookup=None, is_negative=is_not_found, group=None):
+    """
+    Decorator for single-argument lookups against a provider. Calls with the
+    same normalized argument are coalesced per (source, lookup); lookup
+    defaults to the function name and must be unique per provider.
+    """
+    def decorator(func):
+        lookup_name = lookup or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(query):
+            flight = group or _default
+            return flight.do(source, lookup_name, normalize_query(query), lambda: func(query), is_negative)
+        return wrapper
+    return decorator
+
+
+def clear():
+    """Forget all negative-cache entries of the shared coalescer."""
+    _default.clear()
@@ -0,0 +1,229 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import metrics
+import shared_state
+
+# Health tracking and circuit breakers for the metadata providers.
+#
+# Every routed lookup records its latency and whether the provider answered
+# (any response below 500 other than 429) in a rolling window per source.
+# When a source fails CONSECUTIVE_FAILURES times in a row, or at least
+# ERROR_RATE_THRESHOLD of a full window, its breaker opens and lookups are
+# skipped (returning the caller's fallback) for OPEN_SECONDS. After that a
+# single half-open probe is let through; success closes the breaker, failure
+# re-opens it.
+#
+# The server runs one scraper process per request, and each process makes
+# about one call per source, so the statistics only mean something when they
+# are shared. Every allow()/record() is therefore a read-modify-write of the
+# source's entry in a JSON file (VERIFAI_SOURCE_STATE, by default
+# source_state.json in the shared directory) under an exclusive file lock.
+
+WINDOW_SIZE = 20
+MIN_CALLS = 10
+ERROR_RATE_THRESHOLD = 0.5
+CONSECUTIVE_FAILURES = 5
+OPEN_SECONDS = float(os.environ.get("VERIFAI_BREAKER_OPEN_SECONDS", "30"))
+STATE_FILE = os.environ.get("VERIFAI_SOURCE_STATE") or shared_state.path("source_state.json")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+metrics.describe_counter("verifai_source_skipped_total", "Lookups skipped because the source's circuit breaker was open.")
+metrics.describe_counter("verifai_source_breaker_transitions_total", "Circuit breaker state changes per source.")
+
+_local = threading.local()
+
+
+class SourceHealth:
+    """Rolling latency/error statistics and breaker state for one provider."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.window = deque(maxlen=WINDOW_SIZE)  # (ok, latency seconds)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+
+    def allow(self):
+        """Whether a call may go upstream now (claims the probe when half-open)."""
+        with self.lock, self._synced() as sync:
+            if self.state == CLOSED:
+                # Nothing changed, so there is nothing to write back.
+                sync["write"] = False
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= OPEN_SECONDS:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                self.probe_started = time.time()
+                return True
+            return False
+
+    def record(self, ok, latency):
+        with self.lock, self._synced():
+            self.window.append((ok, latency))
+            self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if ok:
+                    self.window.clear()
+                    self._transition(CLOSED)
+                else:
+                    self._open()
+            elif self.state == CLOSED and not ok and self._tripped():
+                self._open()
+
+    @contextmanager
+    def _synced(self, write=True):
+        """
+        Load this source's shared entry and store it back under the file lock,
+        unless write is False (or the block sets the yielded sync["write"] to False).
+        """
+        sync = {"write": write}
+        if not STATE_FILE:
+            yield sync
+            return
+        with shared_state.locked(STATE_FILE) as acquired:
+            if not acquired:
+                # The shared file is unusable; carry on with this process's state.
+                yield sync
+                return
+            data = shared_state.read_json(STATE_FILE, {})
+            if self.name in data:
+                self._load(data[self.name])
+            yield sync
+            if sync["write"]:
+                data[self.name] = self._to_dict()
+                shared_state.write_json(STATE_FILE, data)
+
+    def _tripped(self):
+        if self.consecutive_failures >= CONSECUTIVE_FAILURES:
+            return True
+        return len(self.window) >= MIN_CALLS and self._error_rate() >= ERROR_RATE_THRESHOLD
+
+    def _error_rate(self):
+        return sum(1 for ok, _ in self.window if not ok) / len(self.window) if self.window else 0.0
+
+    def _open(self):
+        self.opened_at = time.time()
+        self._transition(OPEN)
+
+    def _transition(self, state):
+        if state != self.state:
+            self.state = state
+            metrics.inc("verifai_source_breaker_transitions_total", source=self.name, state=state)
+
+    def stats(self):
+        with self.lock, self._synced(write=False):
+            latencies = sorted(latency for _, latency in self.window)
+            return {
+                "state": self.state,
+                "calls": len(self.window),
+                "error_rate": round(self._error_rate(), 3),
+                "consecutive_failures": self.consecutive_failures,
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000.0, 1) if latencies else None,
+                "max_ms": round(latencies[-1] * 1000.0, 1) if latencies else None,
+            }
+
+    def _to_dict(self):
+        return {
+            "state": self.state,
+            "opened_at": self.opened_at,
+            "probing": self.probing,
+            "probe_started": self.probe_started,
+            "consecutive_failures": self.consecutive_failures,
+            "window": list(self.window),
+        }
+
+    def _load(self, data):
+        self.state = data.get("state", CLOSED)
+        self.opened_at = data.get("opened_at", 0.0)
+        self.probe_started = data.get("probe_started", 0.0)
+        # A probe whose process died without recording is given up after OPEN_SECONDS.
+        self.probing = bool(data.get("probing")) and time.time() - self.probe_started < OPEN_SECONDS
+        self.consecutive_failures = data.get("consecutive_failures", 0)
+        self.window.clear()
+        self.window.extend((bool(ok), float(latency)) for ok, latency in data.get("window", []))
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def get_source(name):
+    with _sources_lock:
+        if name not in _sources:
+            _sources[name] = SourceHealth(name)
+        return _sources[name]
+
+
+def health():
+    """Current statistics of every source seen so far."""
+    with _sources_lock:
+        names = sorted(_sources)
+    return {name: get_source(name).stats() for name in names}
+
+
+def note_response(response):
+    """Tell the running lookup that the provider answered, and with what status."""
+    _local.status = response.status_code
+
+
+def _answered(status):
+    return status is not None and status < 500 and status != 429
+
+
+@contextmanager
+def tracking():
+    """Collect the sources skipped by lookups in this thread; yields the list."""
+    previous = getattr(_local, "skipped", None)
+    skipped = _local.skipped = []
+    try:
+        yield skipped
+    finally:
+        _local.skipped = previous
+
+
+def _skip(name):
+    metrics.inc("verifai_source_skipped_total", source=name)
+    skipped = getattr(_local, "skipped", None)
+    if skipped is not None and name not in skipped:
+        skipped.append(name)
+
+
+def routed(source, fallback):
+    """
+    Decorator for lookups against a provider. While the source's breaker is
+    open the lookup is skipped and fallback() is returned; exceptions are
+    recorded as failures and also answered with fallback(). A lookup that
+    returns without reporting a response (note_response) swallowed a
+    network error and counts as a failure.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            health = get_source(source)
+            if not health.allow():
+                _skip(source)
+                return fallback()
+            _local.status = None
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                health.record(False, time.perf_counter() - start)
+                print(f"Error querying {source}: {e}", file=sys.stderr)
+                return fallback()
+            health.record(_answered(_local.status), time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
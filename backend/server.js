@@ -490,6 +490,27 @@ app.post("/api/verify-reference", async (req, res) => {
   }
 });
 
+// 🔹 Metrics: Prometheus totals accumulated by the scraper processes
+app.get("/metrics", (req, res) => {
+  const pythonCommand = process.platform === "win32" ? "python" : "python3";
+  const pythonProcess = spawn(pythonCommand, ["./backend/scrapers/metrics.py"]);
+  let data = "";
+  let errorData = "";
+  pythonProcess.stdout.on("data", (chunk) => {
+    data += chunk;
+  });
+  pythonProcess.stderr.on("data", (chunk) => {
+    errorData += chunk;
+  });
+  pythonProcess.on("close", (code) => {
+    if (code !== 0) {
+      console.error("Metrics export failed:", errorData);
+      return res.status(500).type("text/plain").send(errorData);
+    }
+    res.type("text/plain; version=0.0.4; charset=utf-8").send(data);
+  });
+});
+
 // 🔹 Start the Server
 const port = process.env.PORT || 3002;
 app.listen(port, () => {
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import torch
+
+try:
+    import resource  # Not available on Windows; peak RSS is reported as null there.
+except ImportError:
+    resource = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.abspath(os.path.join(SCRIPT_DIR, "..", "scrapers")))
+
+def load_examples(file_path, limit=None):
+    """Read {"input", "target"} pairs from a JSONL file."""
+    examples = []
+    with open(file_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                examples.append(json.loads(line))
+            if limit and len(examples) >= limit:
+                break
+    return examples
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text or "").strip()
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def normalized_edit_distance(prediction, target):
+    """Edit distance scaled to [0, 1] by the longer string's length."""
+    prediction, target = normalize(prediction), normalize(target)
+    longest = max(len(prediction), len(target))
+    return edit_distance(prediction, target) / longest if longest else 0.0
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB. Each configuration
+    runs in its own process (see run_configuration), so this is its peak.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class GPT2CitationModel:
+    """The GPT-2 citation model used by doi_citation.py, generating in left-padded batches."""
+
+    def __init__(self, max_new_tokens):
+        import doi_citation
+        self.model, self.tokenizer = doi_citation.load_model()
+        # Decoder-only models must be padded on the left for batched generation.
+        self.tokenizer.padding_side = "left"
+        self.max_new_tokens = max_new_tokens
+
+    def generate(self, inputs):
+        # Training concatenated input and target with a space, so the
+        # prompt ends with one and the continuation is the citation.
+        prompts = [text + " " for text in inputs]
+        encoding = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            output_ids = self.model.generate(
+                **encoding,
+                max_new_tokens=self.max_new_tokens,
+                num_return_sequences=1,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+        generated = output_ids[:, encoding["input_ids"].shape[1]:]
+        predictions = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+        tokens = int((generated != self.tokenizer.pad_token_id).sum())
+        return [p.strip() for p in predictions], tokens
+
+class T5CitationModel:
+    """The T5 text2text pipeline used by isbn_citation.py."""
+
+    def __init__(self, max_new_tokens):
+        from transformers import pipeline
+        import isbn_citation
+        self.pipe = pipeline("text2text-generation", model=isbn_citation.CITATION_MODEL_ID)
+        self.max_new_tokens = max_new_tokens
+
+    def generate(self, inputs):
+        outputs = self.pipe(inputs, batch_size=len(inputs), max_new_tokens=self.max_new_tokens, num_return_sequences=1)
+        predictions = [output["generated_text"].strip() for output in outputs]
+        tokens = sum(len(self.pipe.tokenizer.encode(p, add_special_tokens=False)) for p in predictions)
+        return predictions, tokens
+
+MODELS = {
+    "gpt2": GPT2CitationModel,
+    "t5": T5CitationModel,
+}
+
+def evaluate(model, examples, batch_size, threads):
+    """Run one model over all examples at a batch size and thread count."""
+    torch.set_num_threads(threads)
+    # Untimed warm-up batch, so one-time setup (allocator growth, lazy kernel
+    # initialisation) is not charged to the timed run.
+    model.generate([example["input"] for example in examples[:batch_size]])
+    predictions = []
+    generated_tokens = 0
+    start = time.perf_counter()
+    for i in range(0, len(examples), batch_size):
+        batch = [example["input"] for example in examples[i:i + batch_size]]
+        batch_predictions, tokens = model.generate(batch)
+        predictions.extend(batch_predictions)
+        generated_tokens += tokens
+    elapsed = time.perf_counter() - start
+
+    targets = [example["target"] for example in examples]
+    exact = sum(normalize(p) == normalize(t) for p, t in zip(predictions, targets))
+    distances = [normalized_edit_distance(p, t) for p, t in zip(predictions, targets)]
+    return {
+        "batch_size": batch_size,
+        "threads": threads,
+        "examples": len(examples),
+        "exact_match": exact / len(examples),
+        "normalized_edit_distance": sum(distances) / len(distances),
+        "citations_per_s": len(examples) / elapsed if elapsed > 0 else None,
+        "generated_tokens": generated_tokens,
+        "ms_per_token": elapsed * 1000.0 / generated_tokens if generated_tokens else None,
+        "elapsed_s": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "sample": {"input": examples[0]["input"], "prediction": predictions[0], "target": targets[0]},
+    }
+
+def run_configuration(args, model_name, batch_size, threads):
+    """
+    Evaluate one (model, batch size, threads) configuration in a fresh child
+    process, so its peak RSS is not inherited from earlier configurations or
+    from the other model.
+    """
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--eval_file", args.eval_file,
+        "--max_new_tokens", str(args.max_new_tokens),
+        "--configuration", model_name, str(batch_size), str(threads),
+    ]
+    if args.limit:
+        command += ["--limit", str(args.limit)]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        return {"batch_size": batch_size, "threads": threads, "error": f"exited with status {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def evaluate_configuration(examples, model_name, batch_size, threads, max_new_tokens):
+    """Child-process side of run_configuration: load the model and evaluate once."""
+    load_start = time.perf_counter()
+    model = MODELS[model_name](max_new_tokens)
+    load_s = time.perf_counter() - load_start
+    rss_after_load = peak_rss_mb()
+    result = evaluate(model, examples, batch_size, threads)
+    result["load_s"] = load_s
+    result["peak_rss_after_load_mb"] = rss_after_load
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate the citation models for quality (exact match, edit distance) and speed in batches."
+    )
+    parser.add_argument("--eval_file", type=str, default=os.path.join(SCRIPT_DIR, "semantic_train.jsonl"), help="Path to the evaluation data (JSONL with input/target).")
+    parser.add_argument("--models", type=str, nargs="+", default=["gpt2", "t5"], choices=sorted(MODELS), help="Models to evaluate.")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 8], help="Batch sizes to measure.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, torch.get_num_threads()], help="torch intra-op thread counts to measure.")
+    parser.add_argument("--limit", type=int, default=None, help="Only evaluate the first N examples.")
+    parser.add_argument("--max_new_tokens", type=int, default=96, help="Maximum tokens generated per citation.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here instead of stdout.")
+    # Internal: evaluate a single configuration in this process (used by run_configuration).
+    parser.add_argument("--configuration", nargs=3, metavar=("MODEL", "BATCH_SIZE", "THREADS"), default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    examples = load_examples(args.eval_file, args.limit)
+    if not examples:
+        print("No examples found. Exiting.")
+        return
+
+    if args.configuration:
+        model_name, batch_size, threads = args.configuration
+        print(json.dumps(evaluate_configuration(examples, model_name, int(batch_size), int(threads), args.max_new_tokens)))
+        return
+
+    report = {"eval_file": args.eval_file, "examples": len(examples), "models": {}}
+    for model_name in args.models:
+        runs = []
+        report["models"][model_name] = {"runs": runs}
+        for threads in sorted(set(args.threads)):
+            for batch_size in args.batch_sizes:
+                print(f"Evaluating {model_name}: batch_size={batch_size} threads={threads}", file=sys.stderr)
+                runs.append(run_configuration(args, model_name, batch_size, threads))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Evaluation report saved to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()